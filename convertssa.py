@@ -15,8 +15,9 @@ def convertssa(prog, symbols):
     return proc
 
 class SsaConverter(ast.Visitor):
-    def __init__(self, symbols):
+    def __init__(self, symbols, labels=None):
         self.symbols = symbols
+        self.labels = itertools.count(1) if labels is None else labels
         self.current_def = collections.defaultdict(dict)
         self.incomplete_params = collections.defaultdict(dict)
         self.blocks = []
@@ -42,7 +43,7 @@ class SsaConverter(ast.Visitor):
             raise RuntimeError(f'Syntax error: unbound local variable {variable}')
         elif len(block.preds) == 1:
             param = block.param()
-            pred = next(iter(block.preds))
+            pred = block.preds[0]
             avalue = self.read_variable(variable, pred)
             self.add_block_args(variable, param)
             self.set_variable(variable, block, param)
@@ -64,7 +65,7 @@ class SsaConverter(ast.Visitor):
         self.sealed_blocks.add(block)
 
     def new_block(self, addendum=None):
-        block = Block()
+        block = Block(labels=self.labels)
         if addendum is not None:
             block.label += '_' + addendum
         self.blocks.append(block)
@@ -79,7 +80,7 @@ class SsaConverter(ast.Visitor):
         bbodyend.jump(bexit)
         self.seal_block(bexit)
         bexit.ret()
-        return Procedure('__main__', self.blocks, self.procedures)
+        return Procedure('__main__', self.blocks, self.procedures, self.labels)
 
     def get_variable(self, variable, block):
         declaration = self.symbols[self.current_proc].used[variable]
@@ -91,7 +92,7 @@ class SsaConverter(ast.Visitor):
             case sem.LocalVar():
                 return self.read_variable(variable, block)
             case sem.ConstVar(init=value):
-                return block.emit(Inst.const(value))
+                return block.const(value)
             case sem.GlobalVar():
                 return block.emit(Inst.load(variable))
             case _:
@@ -116,7 +117,7 @@ class SsaConverter(ast.Visitor):
         self.current_proc = decl
 
         for pdecl in decl.proc_decls:
-            converter = SsaConverter(self.symbols)
+            converter = SsaConverter(self.symbols, self.labels)
             proc = converter.convert(pdecl.decl)
             proc.label = pdecl.ident
             self.procedures.append(proc)
@@ -129,7 +130,7 @@ class SsaConverter(ast.Visitor):
         return (self.get_variable(expr.ident, block), block)
 
     def visit_NumberExpr(self, expr, block):
-        return (block.emit(Inst.const(expr.number)), block)
+        return (block.const(expr.number), block)
 
     def visit_UnaryExpr(self, expr, block):
         unop_to_opcode = {
@@ -47,20 +47,23 @@ class LengauerTarjan:
             if len(v.children) > 1:
                 for i, u in enumerate(v.children):
                     if len(u.preds) > 1:
-                        b = Block()
+                        b = Block(labels=self.proc.labels)
                         b.label += '_split'
                         b.cont = Cont.jump(u.block)
                         b.preds = [v.block]
                         b.succs = [u.block]
-                        av = {}
-                        aw = {}
-                        for j, pu in enumerate(u.block.params):
+                        edge = v.block.cont.edges[i]
+                        jump = b.cont.target
+                        args = dict(edge.items())
+                        edge.target = b
+                        edge.params = []
+                        edge.values = []
+                        for pu in u.block.params:
                             pw = b.param()
-                            aw[pu] = pw
-                            av[pw] = v.block.cont.edges[i].args[pu]
-                        v.block.cont.edges[i].target = b
-                        v.block.cont.edges[i].args = av
-                        b.cont.target.args = aw
+                            jump.params.append(pu)
+                            jump.values.append(pw)
+                            edge.params.append(pw)
+                            edge.values.append(args[pu])
                         w = Node(b, len(self.nodes))
                         self.nodes.append(w)
                         self.proc.blocks.append(b)
@@ -159,17 +162,21 @@ class LengauerTarjan:
     def calcloops(self):
         self.loops = {}
         self.loopheader = {}
+        self.loopmask = {}
         for v, u in self.backedges:
             nodes = {u, v}
+            mask = (1 << u.index) | (1 << v.index)
             stack = [v]
             while stack:
                 x = stack.pop()
                 for p in x.preds:
                     if p not in nodes:
                         nodes.add(p)
+                        mask |= 1 << p.index
                         stack.append(p)
-            self.loops[u, v] = frozenset(nodes)
-            self.loopheader[self.loops[u, v]] = u
+            loop = self.loops[u, v] = frozenset(nodes)
+            self.loopheader[loop] = u
+            self.loopmask[loop] = mask
 
     def calclnf(self):
         loops = list(self.loops.values())
@@ -178,11 +185,14 @@ class LengauerTarjan:
         parent = defaultdict(lambda: None)
         children = defaultdict(list)
 
+        # Subset tests use the loops' node bitmasks: l1 <= l2 iff m1 & ~m2 == 0.
+        loopmask = self.loopmask
         for l1 in loops:
+            m1 = loopmask[l1]
             for l2 in loops:
                 if l1 is l2:
                     continue
-                if l1.issubset(l2):
+                if not m1 & ~loopmask[l2]:
                     if parent[l1] is None or len(l2) < len(parent[l1]):
                         parent[l1] = l2
 
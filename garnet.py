@@ -2,6 +2,7 @@ from copy import copy
 import collections
 import contextlib
 import enum
+import io
 import itertools
 import unittest
 
@@ -26,15 +27,27 @@ def main():
         print('digraph {', file=file)
         dom = calcdominators(proc1)
         cols = regalloc(proc1, dom)
+        proc1.finalise()
         vis = DebugVisualiser(proc1, dom, cols)
         vis.debug(file=file)
         for subproc in proc1.procedures:
             dom = calcdominators(subproc)
             cols = regalloc(subproc, dom)
+            subproc.finalise()
             vis = DebugVisualiser(subproc, dom, cols)
             vis.debug(file=file)
         print('}', file=file)
 
+class LazyNames(dict):
+    __slots__ = ('mint',)
+
+    def __init__(self, mint):
+        self.mint = mint
+
+    def __missing__(self, value):
+        name = self[value] = self.mint(value)
+        return name
+
 class DebugVisualiser:
     def __init__(self, proc, dom, cols):
         self.proc = proc
@@ -48,51 +61,58 @@ class DebugVisualiser:
             cm = open('dominator.dot', 'w')
         else:
             cm = contextlib.nullcontext(file)
+        buf = io.StringIO()
+        self._debug(proc, buf)
         with cm as file:
-            with contextlib.redirect_stdout(file):
-                self._debug(proc)
+            file.write(buf.getvalue())
 
-    def _debug(self, proc):
-        names = {}
+    def _debug(self, proc, buf):
         counter = itertools.count(1)
         pcounter = itertools.count(1)
         SHOWREG = 1
+
+        def mint(inst):
+            block = owner[inst]
+            if SHOWREG and inst in self.cols[block]:
+                return str(self.cols[block][inst])
+            return 'v' + str(next(counter))
+
+        # Edges name their target's params before that block is printed, so
+        # params are seeded here, along with the block owning each instruction;
+        # instructions are named as they are printed.
+        names = LazyNames(mint)
+        owner = {}
         for block in proc.blocks:
+            for inst in block.insts:
+                owner[inst] = block
             for p in block.params:
                 if p not in names:
                     if SHOWREG:
                         names[p] = str(self.cols[block][p])
                     else:
                         names[p] = 'p' + str(next(pcounter))
-            for i, inst in enumerate(block.insts):
-                if inst not in names:
-                    if SHOWREG and inst in self.cols[block]:
-                        names[inst] = str(self.cols[block][inst])
-                    else:
-                        names[inst] = 'v' + str(next(counter))
         idom = {k.label: v.label for k, v in self.dom.idom.items()}
         for block in proc.blocks:
-            print('\t', block.label, f'[shape=box nojustify=true label="', end='')
+            buf.write(f'\t {block.label} [shape=box nojustify=true label="')
             params = ', '.join(names[param] for param in block.params)
             if params:
                 params = '(' + params + ')'
-            print(f'{block.label}{params}:', end='\\l')
+            buf.write(f'{block.label}{params}:\\l')
             for inst in block.insts:
-                inst.debug(names, end='\\l')
+                inst._emit(buf, names, '\\l')
             if block.cont is not None:
-                block.cont.debug(names, end='\\l')
+                block.cont._emit(buf, names, '\\l')
             else:
-                print('\tNo jump', end='\\l')
+                buf.write('\tNo jump\\l')
             def getname(value):
                 if hasattr(value, 'label'):
                     return value.label
                 return names[value]
-            print('" xlabel="', end='')
-            print('"]')
-            for i in range(len(block.succs)):
-                print('\t', block.label, '->', block.succs[i].label)
+            buf.write('" xlabel=""]\n')
+            for succ in block.succs:
+                buf.write(f'\t {block.label} -> {succ.label}\n')
         for i, j in idom.items():
-            print('\t', i, '->', j, '[color=red,constraint=false]')
+            buf.write(f'\t {i} -> {j} [color=red,constraint=false]\n')
 
 if __name__ == '__main__':
     main()
@@ -89,11 +89,11 @@ class RegisterAllocator:
 
     def parmove(self):
         def do(e, v, u):
-            if not len(e.args):
+            if not e.params:
                 return []
             tmp = 0
             movs = []
-            for ru, rv in e.args.items():
+            for ru, rv in e.items():
                 cu = REGALLOC.index(self.colours[u][ru].reg)
                 cv = REGALLOC.index(self.colours[v][rv].reg)
                 tmp = max([tmp, cu, cv])
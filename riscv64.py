@@ -39,7 +39,12 @@ REGALLOC = [Register.T0, Register.T1, Register.T2, Register.T3, Register.T4,
             Register.S4, Register.S5, Register.S6, Register.S7, Register.S8,
             Register.S9, Register.S10, Register.S11]
 
-class Opcode(enum.Enum):
+class Opcode(enum.IntEnum):
+    # Numbered densely from zero so opcodes can index lookup tables directly
+    @staticmethod
+    def _generate_next_value_(name, start, count, last_values):
+        return count
+
     ADDI = enum.auto()
     SLTI = enum.auto()
     SLTIU = enum.auto()
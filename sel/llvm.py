@@ -0,0 +1,301 @@
+"""Lowers abstract SSA procedures to textual LLVM IR
+
+The output is LLVM assembly rather than llvmlite objects, so it can be run
+directly with lli or compiled with llc without adding a dependency.
+"""
+import io
+import itertools
+import re
+import shutil
+import subprocess
+import unittest
+
+from ssa import Param
+import ssa.abstract as sa
+
+BINARY = {
+    sa.Opcode.ADD: 'add',
+    sa.Opcode.SUB: 'sub',
+    sa.Opcode.MUL: 'mul',
+    sa.Opcode.DIV: 'sdiv',
+    sa.Opcode.SRA: 'ashr',
+    sa.Opcode.SRL: 'lshr',
+    sa.Opcode.SLL: 'shl',
+}
+
+ICMP = {
+    sa.Opcode.SEQ: 'eq',
+    sa.Opcode.SNE: 'ne',
+    sa.Opcode.SLT: 'slt',
+    sa.Opcode.SGT: 'sgt',
+    sa.Opcode.SLE: 'sle',
+    sa.Opcode.SGE: 'sge',
+}
+
+# Symbols the module defines for itself; program names that clash with
+# them are renamed.
+RESERVED = {'main', 'printf'}
+
+PRINT = '''\
+@.fmt = private constant [5 x i8] c"%ld\\0A\\00"
+declare i32 @printf(i8*, ...)
+
+define i64 @print(i64 %x) {
+\t%f = getelementptr [5 x i8], [5 x i8]* @.fmt, i64 0, i64 0
+\tcall i32 (i8*, ...) @printf(i8* %f, i64 %x)
+\tret i64 0
+}
+'''
+
+def symbol(name):
+    if name in RESERVED:
+        return f'{name}.garnet'
+    return name
+
+class LlvmSel:
+    def __init__(self):
+        self.temps = itertools.count(1)
+        self.variables = set()
+        self.callees = {}
+        self.defined = set()
+        self.functions = []
+
+    def temp(self):
+        return f'%t{next(self.temps)}'
+
+    def do_lower(self, inst):
+        match inst:
+            case sa.Const(const):
+                return str(int(const))
+
+            case sa.Load(var):
+                self.variables.add(var)
+                t = self.temp()
+                self.output.append(f'{t} = load i64, i64* @{symbol(var)}')
+                return t
+
+            case sa.Store(e, var):
+                v = self.lower(e)
+                self.variables.add(var)
+                self.output.append(f'store i64 {v}, i64* @{symbol(var)}')
+                return None
+
+            case sa.Unopt(e):
+                return self.lower(e)
+
+            case sa.Nop():
+                return None
+
+        args = [self.lower(arg) for arg in inst.args]
+        opcode = inst.opcode
+        if len(args) == 1 and opcode == sa.Opcode.ADD:
+            return args[0]
+        t = self.temp()
+        if len(args) == 1 and opcode in (sa.Opcode.SUB, sa.Opcode.NEG):
+            self.output.append(f'{t} = sub i64 0, {args[0]}')
+        elif len(args) == 1 and opcode == sa.Opcode.ODD:
+            self.output.append(f'{t} = and i64 {args[0]}, 1')
+        elif len(args) == 2 and opcode in BINARY:
+            self.output.append(f'{t} = {BINARY[opcode]} i64 {args[0]}, {args[1]}')
+        elif len(args) == 2 and opcode in ICMP:
+            c = self.temp()
+            self.output.append(f'{c} = icmp {ICMP[opcode]} i64 {args[0]}, {args[1]}')
+            self.output.append(f'{t} = zext i1 {c} to i64')
+        elif len(args) == 2 and opcode == sa.Opcode.MULH:
+            a, b, p = self.temp(), self.temp(), self.temp()
+            h = self.temp()
+            self.output.append(f'{a} = sext i64 {args[0]} to i128')
+            self.output.append(f'{b} = sext i64 {args[1]} to i128')
+            self.output.append(f'{p} = mul i128 {a}, {b}')
+            self.output.append(f'{h} = ashr i128 {p}, 64')
+            self.output.append(f'{t} = trunc i128 {h} to i64')
+        else:
+            raise RuntimeError(f'Unsupported opcode: {opcode.name}')
+        return t
+
+    def lower(self, value):
+        if isinstance(value, Param):
+            return self.params[value]
+        if value in self.results:
+            return self.results[value]
+        result = self.do_lower(value)
+        self.results[value] = result
+        return result
+
+    def copyargs(self, block, edge, result=None):
+        for p, a in edge.items():
+            if a is sa.AbstractReturnValue:
+                v = result
+            else:
+                v = self.lower(a.find())
+            self.incoming[p].append(f'[ {v}, %{block.label} ]')
+
+    def lower_block(self, block):
+        self.output = []
+
+        # Lowered in program order, so loads stay ordered against stores.
+        for inst in block.insts:
+            self.lower(inst.find())
+
+        match block.cont:
+            case sa.ReturnCont():
+                # RETURN carries no value in the abstract SSA yet.
+                self.output.append('ret i64 0')
+            case sa.JumpCont(target=target):
+                self.copyargs(block, target)
+                self.output.append(f'br label %{target.target.label}')
+            case sa.CallCont(proc=proc, params=params, then=then):
+                args = [self.lower(param.find()) for param in params]
+                self.callees[proc] = len(args)
+                result = self.temp()
+                self.copyargs(block, then, result)
+                args = ', '.join(f'i64 {arg}' for arg in args)
+                self.output.append(f'{result} = call i64 @{symbol(proc)}({args})')
+                self.output.append(f'br label %{then.target.label}')
+            case sa.BranchCont(value=value, ttrue=ttrue, tfals=tfals):
+                v = self.lower(value.find())
+                c = self.temp()
+                self.output.append(f'{c} = icmp ne i64 {v}, 0')
+                self.copyargs(block, ttrue)
+                self.copyargs(block, tfals)
+                self.output.append(f'br i1 {c}, label %{ttrue.target.label}, label %{tfals.target.label}')
+            case _:
+                raise NotImplementedError(f'Not yet implemented: {type(block.cont)}')
+        return self.output
+
+    def lower_proc(self, proc):
+        for subproc in proc.procedures:
+            self.lower_proc(subproc)
+
+        counter = itertools.count(1)
+        # Shared by every block, so a dominating definition is reused rather
+        # than lowered again (a second load could see an intervening store).
+        self.results = {}
+        self.params = {}
+        self.incoming = {}
+        for block in proc.blocks:
+            for param in block.params:
+                self.params[param] = f'%p{next(counter)}'
+                self.incoming[param] = []
+        bodies = [self.lower_block(block) for block in proc.blocks]
+
+        buf = io.StringIO()
+        entry = proc.blocks[0]
+        params = ', '.join(f'i64 {self.params[param]}' for param in entry.params)
+        buf.write(f'define i64 @{symbol(proc.label)}({params}) {{\n')
+        for block, body in zip(proc.blocks, bodies):
+            buf.write(f'{block.label}:\n')
+            if block is not entry:
+                for param in block.params:
+                    incoming = ', '.join(self.incoming[param])
+                    buf.write(f'\t{self.params[param]} = phi i64 {incoming}\n')
+            for line in body:
+                buf.write(f'\t{line}\n')
+        buf.write('}\n')
+        self.defined.add(proc.label)
+        self.functions.append(buf.getvalue())
+
+    def module(self):
+        buf = io.StringIO()
+        for var in sorted(self.variables):
+            buf.write(f'@{symbol(var)} = global i64 0\n')
+        for callee, arity in sorted(self.callees.items()):
+            if callee == 'print' and callee not in self.defined:
+                buf.write(PRINT)
+            elif callee not in self.defined:
+                params = ', '.join(['i64'] * arity)
+                buf.write(f'declare i64 @{symbol(callee)}({params})\n')
+        for function in self.functions:
+            buf.write(f'\n{function}')
+        if '__main__' in self.defined:
+            buf.write('\ndefine i32 @main() {\n')
+            buf.write('\tcall i64 @__main__()\n')
+            buf.write('\tret i32 0\n')
+            buf.write('}\n')
+        return buf.getvalue()
+
+def tollvm(proc):
+    sel = LlvmSel()
+    sel.lower_proc(proc)
+    return sel.module()
+
+class TestLlvm(unittest.TestCase):
+    def do_test(self, source, output=None):
+        from parse import parse
+        from sem import analyse
+        from convertssa import convertssa
+        from opt import optimise
+        prog = parse(source)
+        symbols = analyse(prog)
+        proc = optimise(convertssa(prog, symbols))
+        module = tollvm(proc)
+        self.assertIn('define i64 @__main__()', module)
+        if shutil.which('llvm-as') is not None:
+            result = subprocess.run(['llvm-as', '-o', '/dev/null', '-'],
+                                    input=module, capture_output=True, text=True)
+            self.assertEqual(result.returncode, 0, result.stderr)
+        if shutil.which('lli') is not None:
+            result = subprocess.run(['lli', '-'],
+                                    input=module, capture_output=True, text=True)
+            self.assertEqual(result.returncode, 0, result.stderr)
+            if output is not None:
+                self.assertEqual(result.stdout, output)
+        return module
+
+    def assertLines(self, module, lines):
+        # %t stands for any temporary; their numbers follow allocation order.
+        for line in lines:
+            pattern = re.escape(f'\t{line}\n').replace('%t', r'%t\d+')
+            self.assertRegex(module, pattern)
+
+    def test_prog0(self):
+        from examples import prog0 as prog
+        module = self.do_test(prog, output='0\n')
+        self.assertIn('define i64 @print(i64 %x)', module)
+
+    def test_prog0a(self):
+        from examples import prog0a as prog
+        self.do_test(prog)
+
+    def test_prog1(self):
+        from examples import prog1 as prog
+        module = self.do_test(prog)
+        self.assertIn('@x = global i64 0\n', module)
+        self.assertLines(module, [
+            '%t = mul i64 %t, %t',
+            'store i64 %t, i64* @squ',
+            '%t = icmp sle i64 %t, 10',
+            'br i1 %t, label %b5_wbody, label %b6_wexit',
+            '%t = call i64 @square()',
+            '%p1 = phi i64 [ %t, %b5_wbody ]',
+            '%t = add i64 %t, 1',
+            'br label %b4_wheader',
+        ])
+
+    def test_prog2(self):
+        from examples import prog2 as prog
+        module = self.do_test(prog)
+        self.assertLines(module, [
+            '%p1 = phi i64 [ 2, %b2_fentry ], [ %t, %b7_iexit ]',
+            '%t = icmp slt i64 %p1, %t',
+            '%p2 = phi i64 [ %p1, %b3_wheader ]',
+            '%t = sdiv i64 %t, %p2',
+            '%t = mul i64 %t, %p2',
+            '%t = icmp eq i64 %t, %t',
+            'br i1 %t, label %b6_ithen, label %b7_iexit',
+            '%p3 = phi i64 [ %p2, %b4_wbody ], [ %t, %b6_ithen ]',
+            '%t = add i64 %p3, 1',
+            '%t = icmp slt i64 %t, 100',
+        ])
+
+    def test_main_procedure(self):
+        module = self.do_test('''
+var x;
+procedure main;
+  x := 3;
+begin
+  call main;
+  call print(x)
+end.
+''', output='3\n')
+        self.assertIn('define i64 @main.garnet()', module)
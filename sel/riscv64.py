@@ -30,6 +30,7 @@ def cmp_z(cmp):
 class InsSel:
     def __init__(self):
         self.blockmap = {}
+        self.results = {}
 
     def fixblocks(self, proc):
         for block in proc.blocks:
@@ -141,26 +142,25 @@ class InsSel:
 
             case _:
                 print(f'{inst=}')
-                raise RuntimeError(f'Unsupported opcode: {inst.opcode}')
+                raise RuntimeError(f'Unsupported opcode: {inst.opcode.name}')
 
     def munch_expr(self, value):
         if not isinstance(value, Param):
-            if value.done:
-                return value.result
+            if value in self.results:
+                return self.results[value]
         inst = self.do_munch_expr(value)
-        value.done = True
-        value.result = inst
+        self.results[value] = inst
         if not isinstance(inst, Param):
             self.output.append(inst)
         return inst
 
+    def copyargs(self, edge, newedge, args):
+        for p, a in edge.items():
+            if a is not sa.AbstractReturnValue:
+                newedge.add_arg(p, args[a].find())
+
     def munch_block(self, block):
-        for arg in block.cont.args:
-            arg = arg.find()
-            arg.done = False
-        for inst in block.insts:
-            inst = inst.find()
-            inst.done = False
+        self.results = {}
 
         self.outputs = []
         args = {}
@@ -183,7 +183,7 @@ class InsSel:
                 newblock.cont = sr.ReturnCont()
             case sa.JumpCont(target=target):
                 newblock.cont = sr.Cont.jump(target.target)
-                newblock.cont.target.args = {p: args[a].find() for p, a in target.args.items()}
+                self.copyargs(target, newblock.cont.target, args)
             case sa.CallCont(proc=proc, params=params, then=then):
                 newparams = []
                 for param in params:
@@ -191,14 +191,14 @@ class InsSel:
                     newparams.append(self.munch_expr(param.find()))
                     self.outputs.insert(0, self.output)
                 newblock.cont = sr.Cont.call(proc, newparams, then.target)
-                newblock.cont.then.args = {p: args[a].find() for p, a in then.args.items() if a is not sa.AbstractReturnValue}
+                self.copyargs(then, newblock.cont.then, args)
             case sa.BranchCont(value=value, ttrue=ttrue, tfals=tfals):
                 self.output = []
                 value = self.munch_expr(value.find())
                 self.outputs.insert(0, self.output)
                 newblock.cont = sr.Cont.branch(value, ttrue.target, tfals.target)
-                newblock.cont.ttrue.args = {p: args[a].find() for p, a in ttrue.args.items()}
-                newblock.cont.tfals.args = {p: args[a].find() for p, a in tfals.args.items()}
+                self.copyargs(ttrue, newblock.cont.ttrue, args)
+                self.copyargs(tfals, newblock.cont.tfals, args)
             case _:
                 raise NotImplementedError(f'Not yet implemented: {type(block.cont)}')
         newblock.insts = [a for b in reversed(self.outputs) for a in b]
@@ -263,6 +263,6 @@ def inssel(proc):
         newblock = sel.munch_block(block)
         blocks.append(newblock)
 
-    newproc = Procedure(proc.label, blocks, procs)
+    newproc = Procedure(proc.label, blocks, procs, proc.labels)
     sel.fixblocks(newproc)
     return newproc
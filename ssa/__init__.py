@@ -1,9 +1,13 @@
 import abc
 import enum
+import io
 import itertools
+import sys
 import unittest
+import warnings
 
 __names__ = [
+    'Emitter',
     'ContEdge',
     'Cont',
     'Inst',
@@ -12,36 +16,58 @@ __names__ = [
     'Procedure',
 ]
 
-class ContEdge:
+_EMPTY_FROZENSET = frozenset()
+
+class Emitter:
+    __slots__ = ()
+
+    def debug(self, names=None, end='\n', file=None):
+        if file is None:
+            file = sys.stdout
+        buf = io.StringIO()
+        self._emit(buf, names, end)
+        file.write(buf.getvalue())
+
+class ContEdge(Emitter):
+    __slots__ = ('target', 'params', 'values')
+
     def __init__(self, target):
         self.target = target
-        self.args = {}
+        self.params = []
+        self.values = []
 
     def add_arg(self, param, value):
-        if param.block != self.target:
+        if param.block is not self.target:
             return
-        self.args[param] = value
+        params = self.params
+        for i in range(len(params)):
+            if params[i] is param:
+                self.values[i] = value
+                return
+        params.append(param)
+        self.values.append(value)
+
+    def items(self):
+        return zip(self.params, self.values)
 
     def get_args(self):
-        return frozenset(self.args.values())
-
-    def debug(self, names=None, end='\n'):
-        if self.args:
-            print(self.target.label, end='(')
-            for i, (a, v) in enumerate(self.args.items()):
-                print(a.name(names), end='=')
-                if i == len(self.args) - 1:
-                    print(v.name(names), end='')
-                else:
-                    print(v.name(names), end=', ')
-            print(')', end=end)
+        """Returns the live list of argument values; copy it before mutating"""
+        return self.values
+
+    def _emit(self, buf, names, end):
+        if self.params:
+            args = ', '.join(f'{a.name(names)}={v.name(names)}'
+                             for a, v in self.items())
+            buf.write(f'{self.target.label}({args}){end}')
         else:
-            print(self.target.label, end=end)
+            buf.write(f'{self.target.label}{end}')
+
+class Cont(Emitter):
+    __slots__ = ()
 
-class Cont:
     @property
     def uses(self):
-        return frozenset()
+        return _EMPTY_FROZENSET
 
     @property
     def targets(self):
@@ -49,24 +75,29 @@ class Cont:
 
     @property
     def args(self):
-        return frozenset().union(*(edge.get_args() for edge in self.edges))
+        edges = self.edges
+        if len(edges) == 1:
+            return frozenset(edges[0].get_args())
+        return frozenset(itertools.chain.from_iterable(
+            edge.get_args() for edge in edges))
 
     def add_arg(self, param, value):
         for edge in self.edges:
-            if isinstance(edge, ContEdge):
-                edge.add_arg(param, value)
+            edge.add_arg(param, value)
+
+class Value(Emitter):
+    __slots__ = ('forwarded',)
+    __hash__ = object.__hash__
+    __eq__ = object.__eq__
+
+    # Bumped whenever a value is forwarded, invalidating cached operands.
+    epoch = 0
 
-class Value:
     def __init__(self):
         self.forwarded = None
 
     def find(self):
-        result = self
-        while isinstance(result, Inst):
-            if result.forwarded is None:
-                return result
-            result = result.forwarded
-        return result
+        return self
 
     def replace(self, value):
         print(f'replace {self} with {value}')
@@ -75,6 +106,7 @@ class Value:
     def forward(self, value):
         assert self.forwarded is None
         self.forwarded = value
+        Value.epoch += 1
 
     def name(self, names):
         return names[self]
@@ -83,49 +115,75 @@ class Value:
         return False
 
 class Inst(Value):
+    __slots__ = ('opcode', '_args', '_args_cache', '_args_epoch')
     __match_args__ = ("opcode", "args")
 
     def __init__(self, opcode, args):
-        super().__init__()
+        self.forwarded = None
         self.opcode = opcode
-        self._args = args
+        self._args = args if type(args) is tuple else tuple(args)
+        self._args_cache = None
+        self._args_epoch = -1
 
     def arg(self, i):
-        return self._args[i].find()
+        return self.args[i]
 
     @property
     def args(self):
-        result = []
-        for i in range(len(self._args)):
-            result.append(self.arg(i))
+        if self._args_epoch != Value.epoch:
+            self._args_cache = tuple([arg.find() for arg in self._args])
+            self._args_epoch = Value.epoch
+        return self._args_cache
+
+    def find(self):
+        result = self.forwarded
+        if result is None:
+            return self
+        while isinstance(result, Inst) and result.forwarded is not None:
+            result = result.forwarded
+        value = self
+        while value is not result:
+            value.forwarded, value = result, value.forwarded
         return result
 
-    def __getattribute__(self, name):
+    def __getattr__(self, name):
         if name.startswith('arg_'):
             try:
-                index = int(name[4:])
-            except ValueError:
-                return super().__getattribute__(name)
-            try:
-                return self.arg(index)
-            except IndexError:
-                return super().__getattribute__(name)
-        return super().__getattribute__(name)
-
-    def debug(self, names, end='\n'):
-        parts = [str(self.opcode.name)]
+                return self.arg(int(name[4:]))
+            except (ValueError, IndexError):
+                pass
+        raise AttributeError(
+            f'{type(self).__name__!r} object has no attribute {name!r}')
+
+    def parts(self, names):
+        parts = [self.opcode.name]
         for arg in self.args:
             parts.append(arg.name(names))
+        return parts
+
+    def _emit(self, buf, names, end):
+        parts = ' '.join(self.parts(names))
         if self.output:
-            name = self.name(names)
-            print(f'\t{name} = ' + ' '.join(parts), end=end)
+            buf.write(f'\t{self.name(names)} = {parts}{end}')
         else:
-            print(f'\t' + ' '.join(parts), end=end)
+            buf.write(f'\t{parts}{end}')
 
     def iseffectful(self):
         return True
 
+def _arg_property(index):
+    def arg(self):
+        try:
+            return self.arg(index)
+        except IndexError:
+            raise AttributeError(f'arg_{index}') from None
+    return property(arg)
+
+for i in range(8):
+    setattr(Inst, f'arg_{i}', _arg_property(i))
+
 class Param(Value):
+    __slots__ = ('block',)
     assignable = True
 
     def __init__(self, block):
@@ -139,39 +197,72 @@ class Param(Value):
         return f'@{self.block.label}'
 
 class Names:
-    def __init__(self, prefix='v'):
+    def __init__(self, prefix='v', size=0):
         self.prefix = prefix
         self.dict = {}
-        self.counter = itertools.count(1)
+        self.count = 0
+        self.pool = [f'{prefix}{i}' for i in range(1, size + 1)]
 
     def __getitem__(self, key):
-        if key not in self.dict:
-            self.dict[key] = 'v' + str(next(self.counter))
-        return self.dict[key]
+        d = self.dict
+        name = d.get(key)
+        if name is None:
+            count = self.count
+            if count < len(self.pool):
+                name = self.pool[count]
+            else:
+                name = f'{self.prefix}{count + 1}'
+            self.count = count + 1
+            d[key] = name
+        return name
 
 class Block:
-    anon_labels = (f'b{i}' for i in itertools.count(1))
-    anon_params = (f'p{i}' for i in itertools.count(1))
+    __slots__ = ('insts', 'label', 'cont', 'preds', 'succs', 'params', 'proc')
+    __hash__ = object.__hash__
+    __eq__ = object.__eq__
 
-    def __init__(self, label=None):
+    def __init__(self, label=None, labels=None):
         self.insts = []
         if label is None:
-            label = next(self.anon_labels)
+            if labels is None:
+                raise ValueError('a block without a label needs a label counter')
+            label = f'b{next(labels)}'
         self.label = label
         self.cont = None
         self.preds = []
         self.succs = []
         self.params = []
+        self.proc = None
+
+    def freeze(self):
+        self.insts = tuple(self.insts)
+        self.params = tuple(self.params)
+        self.preds = tuple(self.preds)
+        self.succs = tuple(self.succs)
+
+    def thaw(self):
+        if isinstance(self.insts, tuple):
+            warnings.warn(f'block {self.label} modified after being finalised',
+                          stacklevel=3)
+            if self.proc is not None:
+                self.proc.invalidate()
+            self.insts = list(self.insts)
+            self.params = list(self.params)
+            self.preds = list(self.preds)
+            self.succs = list(self.succs)
 
     def emit_before(self, inst, insts):
+        self.thaw()
         index = self.insts.index(inst)
         self.insts[index:index] = insts
 
     def emit(self, inst):
+        self.thaw()
         self.insts.append(inst)
         return inst
 
     def param(self):
+        self.thaw()
         param = Param(self)
         self.params.append(param)
         return param
@@ -179,27 +270,118 @@ class Block:
     def add_arg(self, param, value):
         self.cont.add_arg(param, value)
 
-class Procedure:
-    def __init__(self, label, blocks, procedures):
+class Procedure(Emitter):
+    def __init__(self, label, blocks, procedures, labels=None):
         self.label = label
         self.blocks = blocks
         self.procedures = procedures
+        # Anonymous blocks added by later passes keep numbering from here.
+        self.labels = itertools.count(1) if labels is None else labels
+        self.positions = None
+        self._flat_insts = None
+        self._flat_key = None
+
+    def finalise(self):
+        """Freezes the blocks into tuples and indexes instruction positions"""
+        self.positions = {}
+        for i, block in enumerate(self.blocks):
+            block.proc = self
+            block.freeze()
+            for j, inst in enumerate(block.insts):
+                self.positions[inst] = (i, j)
+        self._flat_insts = None
+        self._flat_key = None
+
+    def invalidate(self):
+        """Drops the instruction index once a finalised block is modified"""
+        self.positions = None
+        self._flat_insts = None
+        self._flat_key = None
 
-    def debug(self, names=None, end='\n'):
-        for proc in self.procedures:
-            proc.debug(names, end)
+    @property
+    def flat_insts(self):
+        """Every instruction in block order, cached while the blocks are frozen
+
+        The cache remembers each block's instruction tuple. Tuples cannot
+        change, so it stays valid for as long as every block still holds the
+        same one; thawed, reassigned and appended blocks all miss.
+        """
+        key = tuple([b.insts for b in self.blocks])
+        cached = self._flat_key
+        if (cached is not None and len(cached) == len(key)
+                and all(a is b for a, b in zip(cached, key))):
+            return self._flat_insts
+        flat = tuple(itertools.chain.from_iterable(key))
+        if self.positions is not None and all(type(i) is tuple for i in key):
+            self._flat_insts = flat
+            self._flat_key = key
+        return flat
+
+    def _emit(self, buf, names, end):
+        # Nested procedures are dumped before the procedure declaring them.
+        # Popping a preorder walk that pushes children left to right and
+        # reversing it gives that postorder without recursing.
+        order = []
+        stack = [self]
+        while stack:
+            proc = stack.pop()
+            order.append(proc)
+            stack.extend(proc.procedures)
         if names is None:
-            names = Names()
-        print(self.label + ':', end=end)
+            total = sum(len(b.params) + len(b.insts)
+                        for proc in order for b in proc.blocks)
+            names = Names(size=total)
+        for proc in reversed(order):
+            proc._emit_blocks(buf, names, end)
+
+    def _emit_blocks(self, buf, names, end):
+        buf.write(f'{self.label}:{end}')
         for block in self.blocks:
             params = ', '.join(names[param] for param in block.params)
             if params:
-                print(f'{block.label}({params}):', end=end)
+                buf.write(f'{block.label}({params}):{end}')
             else:
-                print(f'{block.label}:', end=end)
+                buf.write(f'{block.label}:{end}')
             for inst in block.insts:
-                inst.debug(names, end=end)
+                inst._emit(buf, names, end)
             if block.cont is not None:
-                block.cont.debug(names, end=end)
+                block.cont._emit(buf, names, end)
             else:
-                print('\tNo jump', end=end)
+                buf.write(f'\tNo jump{end}')
+
+class TestProcedure(unittest.TestCase):
+    def make_proc(self):
+        labels = itertools.count(1)
+        block = Block(labels=labels)
+        block.emit(Inst(None, ()))
+        return Procedure('test', [block], [], labels), block
+
+    def test_thaw_drops_positions(self):
+        proc, block = self.make_proc()
+        proc.finalise()
+        self.assertEqual(proc.positions, {block.insts[0]: (0, 0)})
+        with self.assertWarns(UserWarning):
+            block.emit(Inst(None, ()))
+        self.assertIsNone(proc.positions)
+
+    def test_anonymous_block_needs_labels(self):
+        with self.assertRaises(ValueError):
+            Block()
+
+    def test_flat_insts_follows_mutation(self):
+        proc, block = self.make_proc()
+        proc.finalise()
+        self.assertEqual(proc.flat_insts, tuple(block.insts))
+        with self.assertWarns(UserWarning):
+            block.emit(Inst(None, ()))
+        self.assertEqual(proc.flat_insts, tuple(block.insts))
+        block.emit(Inst(None, ()))
+        self.assertEqual(proc.flat_insts, tuple(block.insts))
+        proc.finalise()
+        extra = Block(labels=proc.labels)
+        extra.emit(Inst(None, ()))
+        proc.blocks.append(extra)
+        self.assertEqual(len(proc.flat_insts), len(block.insts) + 1)
+        block.insts = ()
+        self.assertEqual(len(proc.flat_insts), 1)
+
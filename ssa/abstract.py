@@ -1,5 +1,6 @@
 import enum
 import itertools
+import sys
 import unittest
 
 from ssa import ContEdge
@@ -10,14 +11,40 @@ __names__ = [
     'Type',
     'Opcode',
     'Inst',
+    'UnInst',
+    'BinInst',
     'Block',
     'AbstractReturnValue',
 ]
 
 class Block(ssa.Block):
+    __slots__ = ('consts',)
+
+    def __init__(self, label=None, labels=None):
+        super().__init__(label, labels)
+        self.consts = {}
+
     def __str__(self):
         return self.label
 
+    def emit(self, inst):
+        match inst:
+            case Add(e, Const(0)):
+                return e
+            case Mul(e, Const(1)):
+                return e
+            case Mul(e, Const(int(c))) if c > 0 and c & (c - 1) == 0:
+                k = self.const(c.bit_length() - 1)
+                inst = Inst.binary(Opcode.SLL, e, k)
+        return super().emit(inst)
+
+    def const(self, const, display=str):
+        key = (type(const), const, display)
+        inst = self.consts.get(key)
+        if inst is None:
+            inst = self.consts[key] = self.emit(ConstInst(const, display))
+        return inst
+
     def ret(self):
         assert self.cont is None
         self.cont = Cont.ret()
@@ -47,6 +74,8 @@ class Block(ssa.Block):
         assert self.cont is not None
 
 class Cont(ssa.Cont):
+    __slots__ = ()
+
     @staticmethod
     def ret():
         return ReturnCont()
@@ -68,26 +97,28 @@ class Cont(ssa.Cont):
         return CallCont(proc, params, ethen)
 
 class ReturnCont(Cont):
-    @property
-    def edges(self):
-        return []
+    __slots__ = ()
+    edges = ()
+    targets = ()
+    args = ssa._EMPTY_FROZENSET
+    uses = ssa._EMPTY_FROZENSET
 
-    def debug(self, names=None, end='\n'):
-        print('\tRETURN', end=end)
+    def _emit(self, buf, names, end):
+        buf.write(f'\tRETURN{end}')
 
 class JumpCont(Cont):
+    __slots__ = ('target', 'edges')
+    uses = ssa._EMPTY_FROZENSET
+
     def __init__(self, target):
         self.target = target
+        self.edges = (target,)
 
-    @property
-    def edges(self):
-        return [self.target]
-
-    def debug(self, names=None, end='\n'):
-        print('\tJUMP', end=' ')
-        self.target.debug(names=names, end=end)
+    def _emit(self, buf, names, end):
+        buf.write('\tJUMP ')
+        self.target._emit(buf, names, end)
 
-class AbstractReturnValue:
+class AbstractReturnValue(ssa.Emitter):
     assignable = False
     def __str__(self):
         return '$'
@@ -95,81 +126,75 @@ class AbstractReturnValue:
         return str(self)
     def find(self):
         return self
-    def debug(self, names=None, end='\n'):
-        print('\t' + str(self), end=end)
+    def _emit(self, buf, names, end):
+        buf.write(f'\t{self}{end}')
     @property
     def args(self):
-        return []
+        return ()
     @property
     def output(self):
         return False
 AbstractReturnValue = AbstractReturnValue()
 
 class CallCont(Cont):
+    __slots__ = ('proc', 'params', 'then', 'edges')
+
     def __init__(self, proc, params, then):
         self.proc = proc
         self.params = params
         self.then = then
-
-    @property
-    def edges(self):
-        return [self.then]
+        self.edges = (then,)
 
     @property
     def uses(self):
-        return frozenset(self.args)
+        return frozenset(self.then.values)
 
-    def debug(self, names=None, end='\n'):
+    def _emit(self, buf, names, end):
         if len(self.params):
-            print('\tCALL', self.proc, end='(')
-            for i, arg in enumerate(self.params):
-                print(arg.name(names), end=', ' if i < len(self.params) - 1 else ') ')
+            params = ', '.join(arg.name(names) for arg in self.params)
+            buf.write(f'\tCALL {self.proc}({params}) ')
         else:
-            print('\tCALL', self.proc, end=' ')
-        self.then.debug(names=names, end=end)
+            buf.write(f'\tCALL {self.proc} ')
+        self.then._emit(buf, names, end)
 
 class BranchCont(Cont):
+    __slots__ = ('value', 'ttrue', 'tfals', 'edges', 'uses')
+
     def __init__(self, value, ttrue, tfals):
         self.value = value
         self.ttrue = ttrue
         self.tfals = tfals
-
-    @property
-    def edges(self):
-        return [self.ttrue, self.tfals]
-
-    @property
-    def uses(self):
-        return frozenset({self.value})
-
-    def debug(self, names=None, end='\n'):
-        print('\tBRANCH ' + self.value.name(names), end=' ')
-        self.ttrue.debug(names=names, end=' ')
-        self.tfals.debug(names=names, end=end)
-
-class Opcode(enum.Enum):
-    NOP = enum.auto()
-    UNOPT = enum.auto()
-    CONST = enum.auto()
-    STORE = enum.auto()
-    LOAD = enum.auto()
-    CALL = enum.auto()
-    ODD = enum.auto()
-    ADD = enum.auto()
-    SUB = enum.auto()
-    MUL = enum.auto()
-    MULH = enum.auto()
-    DIV = enum.auto()
-    SLT = enum.auto()
-    SGT = enum.auto()
-    SLE = enum.auto()
-    SGE = enum.auto()
-    SEQ = enum.auto()
-    SNE = enum.auto()
-    NEG = enum.auto()
-    SRA = enum.auto()
-    SRL = enum.auto()
-    SLL = enum.auto()
+        self.edges = (ttrue, tfals)
+        self.uses = frozenset((value,))
+
+    def _emit(self, buf, names, end):
+        buf.write(f'\tBRANCH {self.value.name(names)} ')
+        self.ttrue._emit(buf, names, ' ')
+        self.tfals._emit(buf, names, end)
+
+class Opcode(enum.IntEnum):
+    NOP = 0
+    UNOPT = 1
+    CONST = 2
+    STORE = 3
+    LOAD = 4
+    CALL = 5
+    ODD = 6
+    ADD = 7
+    SUB = 8
+    MUL = 9
+    MULH = 10
+    DIV = 11
+    SLT = 12
+    SGT = 13
+    SLE = 14
+    SGE = 15
+    SEQ = 16
+    SNE = 17
+    NEG = 18
+    SRA = 19
+    SRL = 20
+    SLL = 21
 
 OPCODE0 = [
     Opcode.NOP,
@@ -200,45 +225,52 @@ OPCODE_MATCH = {
     Opcode.STORE: ('arg_0', 'variable'),
     Opcode.LOAD: ('variable',),
     Opcode.CALL: ('procedure',),
+    **{op: () for op in OPCODE0},
+    **{op: ('arg_0',) for op in OPCODE1},
+    **{op: ('arg_0', 'arg_1') for op in OPCODE2},
 }
-for op in OPCODE0:
-    OPCODE_MATCH[op] = ()
-for op in OPCODE1:
-    OPCODE_MATCH[op] = ('arg_0',)
-for op in OPCODE2:
-    OPCODE_MATCH[op] = ('arg_0', 'arg_1')
-
-class InstMeta(type):
-    def __instancecheck__(cls, inst):
-        return (type.__instancecheck__(cls, inst) or
-                (isinstance(inst, Inst) and inst.opcode.name.lower() == cls.__name__.lower()))
 
-for op, match in OPCODE_MATCH.items():
-    globals()[op.name.title()] = InstMeta(
-        op.name.title(), (),
-        {'__match_args__': match})
-    __names__.append(op.name.title())
+_OPCODE_NAME = {op: sys.intern(op.name) for op in Opcode}
+
+_EFFECTFUL_MASK = 0
+for op in (Opcode.STORE, Opcode.CALL):
+    _EFFECTFUL_MASK |= 1 << op.value
+
+_NO_OUTPUT_MASK = 0
+for op in (Opcode.NOP, Opcode.CALL, Opcode.STORE):
+    _NO_OUTPUT_MASK |= 1 << op.value
 
 class Inst(ssa.Inst):
+    __slots__ = ()
+
     @property
     def output(self):
-        return self.opcode not in {Opcode.NOP, Opcode.CALL, Opcode.STORE}
+        return not (_NO_OUTPUT_MASK >> self.opcode) & 1
 
     def __repr__(self):
-        cls = self.__class__.__qualname__
-        args = [str(self.opcode)]
+        args = [f'Opcode.{_OPCODE_NAME[self.opcode]}']
         for arg in self.args:
             args.append(repr(arg))
         parts = ', '.join(args)
-        return f'{cls}({parts})'
+        return f'Inst({parts})'
 
-    def __str__(self):
-        cls = self.__class__.__name__
-        args = [self.opcode.name]
+    def parts(self, names):
+        parts = [_OPCODE_NAME[self.opcode]]
         for arg in self.args:
-            args.append(str(arg))
-        parts = ', '.join(args)
-        return f'{cls}({parts})'
+            parts.append(arg.name(names))
+        return parts
+
+    def __str__(self):
+        name = _OPCODE_NAME[self.opcode]
+        args = self.args
+        if len(args) == 2:
+            return f'Inst({name}, {args[0]}, {args[1]})'
+        if len(args) == 1:
+            return f'Inst({name}, {args[0]})'
+        if not args:
+            return f'Inst({name})'
+        parts = ', '.join(map(str, args))
+        return f'Inst({name}, {parts})'
 
     @staticmethod
     def const(const, display=str):
@@ -258,24 +290,35 @@ class Inst(ssa.Inst):
 
     @staticmethod
     def nop():
-        return Inst(Opcode.NOP, ())
+        return Nop(Opcode.NOP, ())
 
     @staticmethod
     def unary(op, value):
-        return Inst(op, (value,))
+        return OPCODE_CLASS[op](op, (value,))
 
     @staticmethod
     def binary(op, lhs, rhs):
-        return Inst(op, (lhs, rhs))
+        return OPCODE_CLASS[op](op, (lhs, rhs))
 
     def iseffectful(self):
-        return False
+        return bool((_EFFECTFUL_MASK >> self.opcode) & 1)
 
 class ConstInst(Inst):
+    __slots__ = ('const', 'display', 'interned')
+
     def __init__(self, const, display=str):
-        super().__init__(Opcode.CONST, ())
+        self.forwarded = None
+        self.opcode = Opcode.CONST
+        self._args = ()
+        self._args_cache = None
+        self._args_epoch = -1
         self.const = const
         self.display = display
+        self.interned = False
+
+    def forward(self, value):
+        assert not self.interned, f'interned constant {self} forwarded'
+        super().forward(value)
 
     def __repr__(self):
         return f'ConstInst({self.const})'
@@ -283,13 +326,18 @@ class ConstInst(Inst):
     def __str__(self):
         return self.display(self.const)
 
-    def debug(self, names, end='\n'):
-        super().debug(names, end=' ')
-        print(self.display(self.const), end=end)
+    def parts(self, names):
+        return super().parts(names) + [self.display(self.const)]
 
 class StoreInst(Inst):
+    __slots__ = ('variable',)
+
     def __init__(self, variable, value):
-        super().__init__(Opcode.STORE, (value,))
+        self.forwarded = None
+        self.opcode = Opcode.STORE
+        self._args = (value,)
+        self._args_cache = None
+        self._args_epoch = -1
         self.variable = variable
 
     @property
@@ -299,21 +347,76 @@ class StoreInst(Inst):
     def __str__(self):
         return super().__str__() + ' %' + str(self.variable)
 
-    def debug(self, names, end='\n'):
-        super().debug(names, end=' ')
-        print('%' + str(self.variable), end=end)
-
-    def iseffectful(self):
-        return True
+    def parts(self, names):
+        return super().parts(names) + ['%' + str(self.variable)]
 
 class LoadInst(Inst):
+    __slots__ = ('variable',)
+
     def __init__(self, variable):
-        super().__init__(Opcode.LOAD, ())
+        self.forwarded = None
+        self.opcode = Opcode.LOAD
+        self._args = ()
+        self._args_cache = None
+        self._args_epoch = -1
         self.variable = variable
 
     def __str__(self):
         return super().__str__() + ' %' + str(self.variable)
 
-    def debug(self, names, end='\n'):
-        super().debug(names, end=' ')
-        print('%' + str(self.variable), end=end)
+    def parts(self, names):
+        return super().parts(names) + ['%' + str(self.variable)]
+
+class UnInst(Inst):
+    """Base class for the unary opcodes"""
+    __slots__ = ()
+
+    def _emit(self, buf, names, end):
+        arg = self.args[0].name(names)
+        buf.write(self._DBG_FMT.format(self.name(names), arg, end))
+
+class BinInst(Inst):
+    """Base class for the binary opcodes, which also serve as unary + and -"""
+    __slots__ = ()
+
+    @property
+    def lhs(self):
+        return self.args[0]
+
+    @property
+    def rhs(self):
+        return self.args[1]
+
+    def _emit(self, buf, names, end):
+        args = self.args
+        if len(args) != 2:
+            return super()._emit(buf, names, end)
+        lhs = args[0].name(names)
+        rhs = args[1].name(names)
+        buf.write(self._DBG_FMT.format(self.name(names), lhs, rhs, end))
+
+# Every opcode has its own subclass of Inst, so that the match statements
+# in the optimiser and instruction selector are plain isinstance checks.
+OPCODE_CLASS = {
+    Opcode.CONST: ConstInst,
+    Opcode.STORE: StoreInst,
+    Opcode.LOAD: LoadInst,
+}
+for op, match in OPCODE_MATCH.items():
+    if op in OPCODE_CLASS:
+        cls = OPCODE_CLASS[op]
+        cls.__match_args__ = match
+    else:
+        namespace = {'__slots__': (), '__match_args__': match}
+        if op in OPCODE2:
+            base = BinInst
+            namespace['_DBG_FMT'] = f'\t{{}} = {op.name} {{}} {{}}{{}}'
+        elif op in OPCODE1:
+            base = UnInst
+            namespace['_DBG_FMT'] = f'\t{{}} = {op.name} {{}}{{}}'
+        else:
+            base = Inst
+        cls = type(op.name.title(), (base,), namespace)
+        OPCODE_CLASS[op] = cls
+    globals()[op.name.title()] = cls
+    __names__.append(op.name.title())
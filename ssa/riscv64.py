@@ -11,19 +11,26 @@ __names__ = [
     'Block',
 ]
 
+_REG_NAME = {reg: reg.name.lower() for reg in Register}
+
 class Value(ssa.Value, abc.ABC):
+    __slots__ = ()
+
     @abc.abstractmethod
-    def debug(self, names, end='\n'):
-        print(self, end=end)
+    def _emit(self, buf, names, end):
+        buf.write(f'{self}{end}')
 
 class SimpleValue(Value):
+    __slots__ = ()
+
     def name(self, names):
         return str(self)
 
-    def debug(self, names, end='\n'):
-        print(self, end=end)
+    def _emit(self, buf, names, end):
+        buf.write(f'{self}{end}')
 
 class Off(SimpleValue):
+    __slots__ = ('reg', 'off')
     assignable = False
 
     def __init__(self, reg, off):
@@ -38,33 +45,58 @@ class Off(SimpleValue):
         reg = self.reg.name(names)
         return f'{off}({reg})'
 
-class Reg(SimpleValue):
+class InternedValue(SimpleValue):
+    """An immutable operand shared between every use of the same key
+
+    Subclasses look up and fill in instances in __new__, so __init__ must
+    not touch them again.
+    """
+    __slots__ = ()
+
+    def __init__(self, *args, **kwds):
+        pass
+
+class Reg(InternedValue):
+    __slots__ = ('reg',)
     assignable = True
+    _cache = {}
 
-    def __init__(self, reg):
-        self.reg = reg
+    def __new__(cls, reg):
+        self = cls._cache.get(reg)
+        if self is None:
+            self = cls._cache[reg] = super().__new__(cls)
+            self.reg = reg
+        return self
 
     def __repr__(self):
         return f'Reg({self.reg.name})'
 
     def __str__(self):
-        return self.reg.name.lower()
+        return _REG_NAME[self.reg]
 
 class Zero(SimpleValue):
+    __slots__ = ()
     assignable = False
 
     def __str__(self):
         return 'x0'
 
-class Imm(SimpleValue):
+class Imm(InternedValue):
+    __slots__ = ('imm', 'display')
     __match_args__ = ('imm',)
     assignable = False
+    _cache = {}
 
-    def __init__(self, imm, display=None):
-        self.imm = imm
+    def __new__(cls, imm, display=None):
         if display is None:
             display = str
-        self.display = display
+        key = (type(imm), imm, display)
+        self = cls._cache.get(key)
+        if self is None:
+            self = cls._cache[key] = super().__new__(cls)
+            self.imm = imm
+            self.display = display
+        return self
 
     def name(self, names):
         return str(self)
@@ -75,12 +107,18 @@ class Imm(SimpleValue):
     def __repr__(self):
         return f'Imm({self.imm})'
 
-class Sym(SimpleValue):
+class Sym(InternedValue):
+    __slots__ = ('sym',)
     __match_args__ = ('sym',)
     assignable = False
+    _cache = {}
 
-    def __init__(self, sym):
-        self.sym = sym
+    def __new__(cls, sym):
+        self = cls._cache.get(sym)
+        if self is None:
+            self = cls._cache[sym] = super().__new__(cls)
+            self.sym = sym
+        return self
 
     def __str__(self):
         return self.sym
@@ -88,50 +126,49 @@ class Sym(SimpleValue):
     def __repr__(self):
         return f'Sym({self.sym})'
 
-class PseudoOpcode(enum.Enum):
-    # pseudo
-    CONST = enum.auto()
+class PseudoOpcode(enum.IntEnum):
+    # pseudo, numbered clear of Opcode so the two never compare equal
+    CONST = 1001
     FUNC = enum.auto()
     PARAM = enum.auto()
     CALL = enum.auto()
 
+_OPCODE_NAME = {op: op.name.lower() for op in (*Opcode, *PseudoOpcode)}
+
+_NO_OUTPUT = frozenset({
+    Opcode.NOP, Opcode.SD, Opcode.SW, Opcode.SH,
+    Opcode.SB, Opcode.MV, PseudoOpcode.CALL})
+
 class Inst(ssa.Inst, Value):
+    __slots__ = ()
     assignable = True
 
-    def __init__(self, opcode, args):
-        super().__init__(opcode, args)
-
     @property
     def output(self):
-        return self.opcode not in {
-                Opcode.NOP, Opcode.SD, Opcode.SW, Opcode.SH,
-                Opcode.SB, Opcode.MV, PseudoOpcode.CALL}
+        return self.opcode not in _NO_OUTPUT
 
     def __str__(self):
-        args = ', '.join(map(str, self.args))
-        return f'{self.opcode.name}({args})'
+        name = self.opcode.name
+        args = self.args
+        if len(args) == 2:
+            return f'{name}({args[0]}, {args[1]})'
+        if len(args) == 1:
+            return f'{name}({args[0]})'
+        if not args:
+            return f'{name}()'
+        parts = ', '.join(map(str, args))
+        return f'{name}({parts})'
 
     def __repr__(self):
-        args = ', '.join(map(str, self.args))
-        return f'Inst({self.opcode}, {self.args})'
-
-    def debug(self, names, end='\n'):
-        parts = []
-        for arg in self.args:
-            parts.append(arg.name(names))
-        if 0:
-            if self.output:
-                name = self.name(names)
-                print(f'\t{name} = ', end='')
-            else:
-                print('\t', end='')
-            print(f'{self.opcode.name.upper()} ' + ','.join(parts), end=end)
+        return f'Inst({type(self.opcode).__name__}.{self.opcode.name}, {self.args})'
+
+    def _emit(self, buf, names, end):
+        args = ','.join([arg.name(names) for arg in self.args])
+        op = _OPCODE_NAME[self.opcode]
+        if self.output:
+            buf.write(f'\t{op} {self.name(names)},{args}{end}')
         else:
-            print('\t', end='')
-            print(self.opcode.name.lower(), end=' ')
-            if self.output:
-                print(self.name(names), end=',')
-            print(','.join(parts), end=end)
+            buf.write(f'\t{op} {args}{end}')
 
     @staticmethod
     def const(const):
@@ -158,36 +195,50 @@ class Inst(ssa.Inst, Value):
         return Inst(op, (v1, v2))
 
 class ConstInst(Inst):
+    __slots__ = ('const',)
+
     def __init__(self, const):
-        super().__init__(PseudoOpcode.CONST, ())
+        self.forwarded = None
+        self.opcode = PseudoOpcode.CONST
+        self._args = ()
+        self._args_cache = None
+        self._args_epoch = -1
         self.const = const
 
     def __str__(self):
         return f'{self.opcode.name}({self.const})'
 
     def __repr__(self):
-        return f'ConstInst({self.opcode}, {self.const})'
+        return f'ConstInst(PseudoOpcode.{self.opcode.name}, {self.const})'
 
-    def debug(self, names, end='\n'):
-        super().debug(names, end=' ')
-        print(str(self.const), end=end)
+    def _emit(self, buf, names, end):
+        super()._emit(buf, names, ' ')
+        buf.write(f'{self.const}{end}')
 
 class FuncInst(Inst):
+    __slots__ = ('func',)
+
     def __init__(self, func):
-        super().__init__(PseudoOpcode.FUNC, ())
+        self.forwarded = None
+        self.opcode = PseudoOpcode.FUNC
+        self._args = ()
+        self._args_cache = None
+        self._args_epoch = -1
         self.func = func
 
     def __str__(self):
         return f'{self.opcode.name}({self.func})'
 
     def __repr__(self):
-        return f'FuncInst({self.opcode}, {self.func})'
+        return f'FuncInst(PseudoOpcode.{self.opcode.name}, {self.func})'
 
-    def debug(self, names, end='\n'):
-        super().debug(names, end=' ')
-        print(str(self.func), end=end)
+    def _emit(self, buf, names, end):
+        super()._emit(buf, names, ' ')
+        buf.write(f'{self.func}{end}')
 
 class Cont(ssa.Cont):
+    __slots__ = ()
+
     @staticmethod
     def ret():
         return ReturnCont()
@@ -209,65 +260,58 @@ class Cont(ssa.Cont):
         return CallCont(proc, params, ethen)
 
 class ReturnCont(Cont):
-    @property
-    def edges(self):
-        return []
+    __slots__ = ()
+    edges = ()
+    targets = ()
+    args = ssa._EMPTY_FROZENSET
+    uses = ssa._EMPTY_FROZENSET
 
-    def debug(self, names, end='\n'):
-        print('\treturn', end=end)
+    def _emit(self, buf, names, end):
+        buf.write(f'\treturn{end}')
 
 class JumpCont(Cont):
+    __slots__ = ('target', 'edges')
+    uses = ssa._EMPTY_FROZENSET
+
     def __init__(self, target):
         self.target = target
+        self.edges = (target,)
 
-    @property
-    def edges(self):
-        return [self.target]
-
-    def debug(self, names, end='\n'):
-        print('\tjump', end=' ')
-        self.target.debug(names=names, end=end)
+    def _emit(self, buf, names, end):
+        buf.write('\tjump ')
+        self.target._emit(buf, names, end)
 
 class BranchCont(Cont):
+    __slots__ = ('value', 'ttrue', 'tfals', 'edges', 'uses')
+
     def __init__(self, value, ttrue, tfals):
         self.value = value
         self.ttrue = ttrue
         self.tfals = tfals
+        self.edges = (ttrue, tfals)
+        self.uses = frozenset((value,))
 
-    @property
-    def edges(self):
-        return [self.ttrue, self.tfals]
-
-    @property
-    def uses(self):
-        return frozenset({self.value})
-
-    def debug(self, names, end='\n'):
-        print('\tbranch ' + self.value.name(names), end=' ')
-        self.ttrue.debug(names=names, end=' ')
-        self.tfals.debug(names=names, end=end)
+    def _emit(self, buf, names, end):
+        buf.write(f'\tbranch {self.value.name(names)} ')
+        self.ttrue._emit(buf, names, ' ')
+        self.tfals._emit(buf, names, end)
 
 class CallCont(Cont):
+    __slots__ = ('proc', 'params', 'then', 'edges')
+
     def __init__(self, proc, params, then):
         self.proc = proc
         self.params = params
         self.then = then
+        self.edges = (then,)
 
-    @property
-    def edges(self):
-        return [self.then]
-
-    def debug(self, names, end='\n'):
+    def _emit(self, buf, names, end):
         if len(self.params):
-            print('\tcall ' + self.proc, end='(')
-            for i, arg in enumerate(self.params):
-                if i == len(self.params) - 1:
-                    print(arg.name(names), end=') ')
-                else:
-                    print(arg.name(names), end=', ')
+            params = ', '.join(arg.name(names) for arg in self.params)
+            buf.write(f'\tcall {self.proc}({params}) ')
         else:
-            print('\tcall ' + self.proc, end=' ')
-        self.then.debug(names=names, end=end)
+            buf.write(f'\tcall {self.proc} ')
+        self.then._emit(buf, names, end)
 
 class Block(ssa.Block):
-    pass
+    __slots__ = ()
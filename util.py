@@ -1,5 +1,8 @@
 import functools
 import inspect
+import os
+
+TRACE_ENABLED = os.environ.get('GARNET_TRACE') == '1'
 
 class GarnetError(RuntimeError):
     pass
@@ -7,23 +10,50 @@ class GarnetError(RuntimeError):
 def trace(*, include_self=False, restrict=None, name=None):
     def decorator(f):
         sig = inspect.signature(f)
+        params = sig.parameters.values()
+        names = tuple(sig.parameters)
+        shown = frozenset(k for k in names
+                          if (include_self or k != 'self')
+                          and (restrict is None or k in restrict))
+        # Calls passing every parameter positionally can skip sig.bind,
+        # which dominates the cost of tracing hot functions.
+        positional = all(p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD)
+                         for p in params)
 
         @functools.wraps(f)
         def wrapper(*args, **kwds):
-            ba = sig.bind(*args, **kwds)
-            ba.apply_defaults()
+            if not TRACE_ENABLED:
+                return f(*args, **kwds)
+            if positional and not kwds and len(args) == len(names):
+                arguments = zip(names, args)
+            else:
+                ba = sig.bind(*args, **kwds)
+                ba.apply_defaults()
+                arguments = ba.arguments.items()
             print(f.__name__ if name is None else name, end='(')
             parts = []
-            for k, v in ba.arguments.items():
-                if include_self or k != 'self':
-                    if restrict is None or k in restrict:
+            for k, v in arguments:
+                if k in shown:
+                    find = getattr(type(v), 'find', None)
+                    if find is not None:
                         try:
-                            v = v.find()
-                        except:
+                            v = find(v)
+                        except Exception:
                             pass
-                        parts.append(f'{k}={v}')
+                    parts.append(f'{k}={v}')
             print(', '.join(parts), end=')\n')
             return f(*args, **kwds)
 
         return wrapper
     return decorator
+
+def _enable():
+    global TRACE_ENABLED
+    TRACE_ENABLED = True
+
+def _disable():
+    global TRACE_ENABLED
+    TRACE_ENABLED = False
+
+trace.enable = _enable
+trace.disable = _disable